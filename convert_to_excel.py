@@ -3,7 +3,7 @@
 Convert apartment listings JSON files to Excel and CSV formats
 """
 
-from services.excel_converter_service import ExcelConverterService
+from services.excel_converter_service import ExcelConverterService, DEFAULT_FORMATS
 import sys
 
 def main():
@@ -12,12 +12,19 @@ def main():
     print("🏠 APARTMENT LISTINGS TO EXCEL/CSV CONVERTER")
     print("=" * 60)
     
+    # Excel output is opt-in with --xlsx
+    args = sys.argv[1:]
+    formats = set(DEFAULT_FORMATS)
+    if '--xlsx' in args:
+        args.remove('--xlsx')
+        formats.add('xlsx')
+    
     # Initialize converter service
-    converter = ExcelConverterService()
+    converter = ExcelConverterService(formats=formats)
     
     # Check if specific file was requested
-    if len(sys.argv) > 1:
-        filename = sys.argv[1]
+    if args:
+        filename = args[0]
         print(f"📄 Converting specific file: {filename}")
         converter.convert_specific_file(filename)
     else:
@@ -4,20 +4,26 @@ Districts Scraper
 Scrapes listings for districts with proper direction_id handling
 """
 
-import json
+import asyncio
+import functools
+import logging
+import math
 import os
-import requests
-import time
-from datetime import datetime, date
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, date, timezone
 from pathlib import Path
-import pytz
+from zoneinfo import ZoneInfo
+import aiohttp
+import orjson
 from dotenv import load_dotenv
 from services.google_maps_service import GoogleMapsService
-from services.excel_converter_service import ExcelConverterService
+from services.excel_converter_service import ExcelConverterService, SUPPORTED_FORMATS
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # =============================================================================
 # CONFIGURATION - Modify these values as needed
 # =============================================================================
@@ -26,10 +32,16 @@ load_dotenv()
 API_URL = os.getenv("API_URL")
 if not API_URL:
     raise ValueError("API_URL environment variable is required")
+BASE_URL = API_URL.replace('/graphql', '')  # Prefix for full listing URLs
 TIMEOUT = 30
 MAX_RETRIES = 3
+MAX_RETRY_AFTER = 60  # Longest server-requested wait (seconds) we honour
+MAX_CONCURRENT_REQUESTS = 16  # In-flight API requests shared by all districts
+CONNECTION_POOL_LIMIT = 64
+KEEPALIVE_TIMEOUT = 60  # Seconds idle connections stay open for reuse
 HEADERS = {
     "Content-Type": "application/json",
+    "Accept-Encoding": "gzip, deflate",
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
 }
 
@@ -41,13 +53,17 @@ MAX_PRICE = 60000
 # Date filtering - modify this date to scrape listings after this date
 AFTER_DATE = "2025-11-01"  # Format: YYYY-MM-DD
 
+# Timezones used when converting listing timestamps
+RIYADH_TZ = ZoneInfo("Asia/Riyadh")
+UTC_TZ = timezone.utc
+
 # Target districts - loaded from environment variable
 TARGET_DISTRICTS_JSON = os.getenv("TARGET_DISTRICTS")
 if not TARGET_DISTRICTS_JSON:
     raise ValueError("TARGET_DISTRICTS environment variable is required")
 try:
-    TARGET_DISTRICTS = json.loads(TARGET_DISTRICTS_JSON)
-except json.JSONDecodeError as e:
+    TARGET_DISTRICTS = orjson.loads(TARGET_DISTRICTS_JSON)
+except orjson.JSONDecodeError as e:
     raise ValueError(f"TARGET_DISTRICTS must be valid JSON: {e}")
 
 # Office coordinates for distance calculations
@@ -62,6 +78,16 @@ OFFICE_DESCRIPTION = "Office location for distance calculations"
 OUTPUT_BASE_DIR = Path("output")
 EXCEL_BASE_DIR = Path("excel_output")
 
+# Converted output formats - add xlsx to also write Excel files (slowest)
+EXPORT_FORMATS = {fmt.strip() for fmt in os.getenv("EXPORT_FORMATS", "csv,parquet").split(",") if fmt.strip()}
+if not EXPORT_FORMATS or not EXPORT_FORMATS <= set(SUPPORTED_FORMATS):
+    raise ValueError(f"EXPORT_FORMATS must be a comma-separated list of: {', '.join(SUPPORTED_FORMATS)}")
+
+# Logging - set LOG_LEVEL=DEBUG to see per-page progress
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+if not isinstance(logging.getLevelName(LOG_LEVEL), int):
+    raise ValueError("LOG_LEVEL must be one of: DEBUG, INFO, WARNING, ERROR, CRITICAL")
+
 # =============================================================================
 # CONFIGURATION CLASS
 # =============================================================================
@@ -69,11 +95,12 @@ EXCEL_BASE_DIR = Path("excel_output")
 class DistrictsConfig:
     """Configuration for districts scraper"""
     
-    @classmethod
-    def load_districts(cls):
-        """Load district data from JSON file"""
-        with open("raw/riyadh_districts.json", 'r', encoding='utf-8') as f:
-            return json.load(f)
+    @staticmethod
+    @functools.lru_cache(maxsize=1)
+    def load_districts():
+        """Load district data from JSON file (parsed once per process)"""
+        with open("raw/riyadh_districts.json", 'rb') as f:
+            return orjson.loads(f.read())
     
     @classmethod
     def get_target_districts(cls):
@@ -93,7 +120,7 @@ class DistrictsConfig:
                     "full_info": district_info
                 })
             else:
-                print(f"⚠️ District {district_id} ({district_config['name']}) not found in districts file")
+                logger.warning("⚠️ District %s (%s) not found in districts file", district_id, district_config['name'])
         
         return target_districts
     
@@ -110,6 +137,115 @@ class DistrictsConfig:
         excel_dir = EXCEL_BASE_DIR / scrape_date
         return json_dir, excel_dir
 
+# =============================================================================
+# GRAPHQL QUERY
+# =============================================================================
+
+FIND_LISTINGS_QUERY = """fragment WebResult on WebResults {
+  total
+  listings {
+    id
+    rnpl_monthly_price
+    ac
+    age
+    apts
+    area
+    backyard
+    beds
+    category
+    city_id
+    create_time
+    published_at
+    direction_id
+    district_id
+    province_id
+    extra_unit
+    family
+    family_section
+    fb
+    fl
+    furnished
+    ketchen
+    last_update
+    refresh
+    lift
+    livings
+    location {
+      lat
+      lng
+      __typename
+    }
+    men_place
+    price
+    price_2_payments
+    price_4_payments
+    price_12_payments
+    range_price
+    rent_period
+    rooms
+    stairs
+    stores
+    status
+    street_direction
+    user {
+      phone
+      name
+      bml_license_number
+      bml_url
+    }
+    wc
+    women_place
+    published
+    content
+    address
+    district
+    direction
+    city
+    title
+    path
+    uri
+    range_price
+    original_range_price
+    plan_no
+    parcel_no
+  }
+}
+
+query findListings($size: Int, $from: Int, $sort: SortInput, $where: WhereInput, $polygon: [LocationInput!], $daily_renting_filter: DailyRentingFilter, $sov: SovListingsFilter) {
+  Web {
+    find(
+      size: $size
+      from: $from
+      sort: $sort
+      where: $where
+      polygon: $polygon
+      daily_renting_filter: $daily_renting_filter
+    ) {
+      ...WebResult
+      __typename
+    }
+    sov: find(
+      from: $from
+      sort: $sort
+      where: $where
+      polygon: $polygon
+      daily_renting_filter: $daily_renting_filter
+      size: 6
+      sov_listings: $sov
+    ) {
+      ...WebResult
+      __typename
+    }
+    __typename
+  }
+}"""
+
+# Static part of every findListings request; only the variables change per page
+FIND_LISTINGS_PAYLOAD = {
+    "operationName": "findListings",
+    "query": FIND_LISTINGS_QUERY
+}
+
 # =============================================================================
 # API CLIENT
 # =============================================================================
@@ -120,9 +256,59 @@ class DistrictsAPIClient:
     def __init__(self):
         self.url = API_URL
         self.headers = HEADERS
-        self.timeout = TIMEOUT
+        self.timeout = aiohttp.ClientTimeout(total=TIMEOUT)
+        self.semaphore = asyncio.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+        self.session = None
+    
+    async def __aenter__(self):
+        """Open a shared keep-alive HTTP session for all requests"""
+        connector = aiohttp.TCPConnector(
+            limit=CONNECTION_POOL_LIMIT,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=300
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            headers=self.headers,
+            timeout=self.timeout,
+            auto_decompress=True
+        )
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+    
+    async def _post(self, payload):
+        """Send a GraphQL request with retries, bounded by the shared semaphore"""
+        
+        body = orjson.dumps(payload)
+        
+        for attempt in range(MAX_RETRIES):
+            retry_after = None
+            try:
+                async with self.semaphore:
+                    async with self.session.post(self.url, data=body) as response:
+                        if response.status == 200:
+                            return orjson.loads(await response.read())
+                        
+                        logger.warning("HTTP %s: %s", response.status, await response.text())
+                        retry_after = parse_retry_after(response.headers)
+                        
+                        # Throttled or failing server without a usable Retry-After: back off anyway
+                        if retry_after is None and (response.status == 429 or response.status >= 500):
+                            retry_after = 2 ** attempt
+                        
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning("Request attempt %d failed: %s", attempt + 1, e)
+                retry_after = 2 ** attempt
+            
+            # Back off on network errors and when the server asks us to slow down
+            if retry_after and attempt < MAX_RETRIES - 1:
+                await asyncio.sleep(retry_after)
+                    
+        return None
     
-    def get_listings_after_date(self, district_id, direction_id, after_date, family=0, page_size=20, offset=0):
+    async def get_listings_after_date(self, district_id, direction_id, after_date, page_size=20, offset=0):
         """Get listings for a district created after a specific date"""
         
         # Convert date string to timestamp
@@ -130,194 +316,78 @@ class DistrictsAPIClient:
             after_datetime = datetime.strptime(after_date, "%Y-%m-%d")
             after_timestamp = int(after_datetime.timestamp())
         except ValueError:
-            print(f"❌ Invalid date format: {after_date}. Use YYYY-MM-DD format.")
+            logger.error("❌ Invalid date format: %s. Use YYYY-MM-DD format.", after_date)
             return None
         
-        payload = {
-            "operationName": "findListings",
-            "variables": {
-                "size": page_size,
-                "from": offset,
-                "sort": {"create_time": "desc", "has_img": "desc"},
-                "sov": {
-                    "listing_category": 1,
-                    "city_id": 21,
-                    "district_id": district_id,
-                    "direction_id": direction_id,
-                    "enabled": True,
-                    "campaign_category": "PROMOTED"
-                },
-                "where": {
-                    "category": {"eq": 1},
-                    "city_id": {"eq": 21},
-                    "direction_id": {"eq": direction_id},
-                    "district_id": {"eq": district_id},
-                    "family": {"eq": family},
-                    "create_time": {"gte": after_timestamp}  # Date filtering
-                }
+        variables = {
+            "size": page_size,
+            "from": offset,
+            "sort": {"create_time": "desc", "has_img": "desc"},
+            "sov": {
+                "listing_category": 1,
+                "city_id": 21,
+                "district_id": district_id,
+                "direction_id": direction_id,
+                "enabled": True,
+                "campaign_category": "PROMOTED"
             },
-            "query": """fragment WebResult on WebResults {
-              total
-              listings {
-                id
-                rnpl_monthly_price
-                ac
-                age
-                apts
-                area
-                backyard
-                beds
-                category
-                city_id
-                create_time
-                published_at
-                direction_id
-                district_id
-                province_id
-                extra_unit
-                family
-                family_section
-                fb
-                fl
-                furnished
-                ketchen
-                last_update
-                refresh
-                lift
-                livings
-                location {
-                  lat
-                  lng
-                  __typename
-                }
-                men_place
-                price
-                price_2_payments
-                price_4_payments
-                price_12_payments
-                range_price
-                rent_period
-                rooms
-                stairs
-                stores
-                status
-                street_direction
-                user {
-                  phone
-                  name
-                  bml_license_number
-                  bml_url
-                }
-                wc
-                women_place
-                published
-                content
-                address
-                district
-                direction
-                city
-                title
-                path
-                uri
-                range_price
-                original_range_price
-                plan_no
-                parcel_no
-              }
+            "where": {
+                "category": {"eq": 1},
+                "city_id": {"eq": 21},
+                "direction_id": {"eq": direction_id},
+                "district_id": {"eq": district_id},
+                "create_time": {"gte": after_timestamp}  # Date filtering
             }
-
-            query findListings($size: Int, $from: Int, $sort: SortInput, $where: WhereInput, $polygon: [LocationInput!], $daily_renting_filter: DailyRentingFilter, $sov: SovListingsFilter) {
-              Web {
-                find(
-                  size: $size
-                  from: $from
-                  sort: $sort
-                  where: $where
-                  polygon: $polygon
-                  daily_renting_filter: $daily_renting_filter
-                ) {
-                  ...WebResult
-                  __typename
-                }
-                sov: find(
-                  from: $from
-                  sort: $sort
-                  where: $where
-                  polygon: $polygon
-                  daily_renting_filter: $daily_renting_filter
-                  size: 6
-                  sov_listings: $sov
-                ) {
-                  ...WebResult
-                  __typename
-                }
-                __typename
-              }
-            }"""
         }
+        payload = {**FIND_LISTINGS_PAYLOAD, "variables": variables}
         
-        for attempt in range(MAX_RETRIES):
-            try:
-                response = requests.post(
-                    self.url, 
-                    headers=self.headers, 
-                    json=payload, 
-                    timeout=self.timeout
-                )
-                
-                if response.status_code == 200:
-                    return response.json()
-                else:
-                    print(f"HTTP {response.status_code}: {response.text}")
-                    
-            except requests.exceptions.RequestException as e:
-                print(f"Request attempt {attempt + 1} failed: {e}")
-                if attempt < MAX_RETRIES - 1:
-                    time.sleep(2 ** attempt)
-                    
-        return None
+        return await self._post(payload)
     
-    def get_all_new_listings(self, district_id, direction_id, after_date, family=0):
+    async def get_all_new_listings(self, district_id, direction_id, after_date):
         """Get all new listings for a district with automatic pagination"""
         
-        all_listings = []
-        total_listings = 0
-        offset = 0
         page_size = 20
         
-        print(f"Fetching new listings for district {district_id} after {after_date}...")
+        logger.debug("Fetching new listings for district %s after %s...", district_id, after_date)
         
-        while True:
-            data = self.get_listings_after_date(district_id, direction_id, after_date, family, page_size, offset)
-            if not data:
-                print(f"Failed to fetch data for district {district_id}")
-                return None
-            
-            # Extract results
-            web_data = data.get('data', {}).get('Web', {})
-            main_results = web_data.get('find', {})
-            
-            # Get pagination info
-            current_total = main_results.get('total', 0)
-            current_listings = main_results.get('listings', [])
-            
-            # Update total on first request
-            if offset == 0:
-                total_listings = current_total
-                print(f"Total new listings available: {total_listings}")
-            
-            # Add current page listings
-            all_listings.extend(current_listings)
-            print(f"Fetched {len(current_listings)} listings (offset: {offset})")
-            
-            # Check if we've got all listings
-            if len(all_listings) >= total_listings or len(current_listings) < page_size:
-                break
+        # The first page tells us how many listings there are in total
+        data = await self.get_listings_after_date(district_id, direction_id, after_date, page_size, 0)
+        if not data:
+            logger.error("Failed to fetch data for district %s", district_id)
+            return None
+        
+        try:
+            web_data = data['data']['Web']
+        except (KeyError, TypeError):
+            web_data = {}
+        main_results = web_data.get('find', {})
+        total_listings = main_results.get('total', 0)
+        all_listings = list(main_results.get('listings', []))
+        
+        logger.debug("Total new listings available for district %s: %d", district_id, total_listings)
+        logger.debug("Fetched %d listings (offset: 0)", len(all_listings))
+        
+        # Request all remaining pages at once; the client semaphore bounds concurrency
+        if len(all_listings) >= page_size:
+            offsets = range(page_size, total_listings, page_size)
+            pages = await asyncio.gather(*[
+                self.get_listings_after_date(district_id, direction_id, after_date, page_size, offset)
+                for offset in offsets
+            ])
             
-            offset += page_size
-            time.sleep(1)  # Rate limiting
+            for offset, data in zip(offsets, pages):
+                if not data:
+                    logger.error("Failed to fetch data for district %s", district_id)
+                    return None
+                
+                try:
+                    current_listings = data['data']['Web']['find']['listings']
+                except (KeyError, TypeError):
+                    current_listings = []
+                all_listings.extend(current_listings)
+                logger.debug("Fetched %d listings (offset: %d)", len(current_listings), offset)
         
-        print(f"✅ Successfully fetched {len(all_listings)}/{total_listings} new listings")
+        logger.debug("Fetched %d/%d new listings for district %s", len(all_listings), total_listings, district_id)
         
         # Return reconstructed response
         return {
@@ -338,35 +408,69 @@ class DistrictsAPIClient:
 # UTILITY FUNCTIONS
 # =============================================================================
 
+# Fields placed first in saved listings; the rest keep the API's order
+PRIORITY_FIELDS = (
+    'rooms',
+    'price',
+    'location',
+    'create_time_riyadh',
+    'published_at_riyadh',
+    'last_update_riyadh',
+    'full_url'
+)
+
+# Top-level address fields moved into the saved listing's location
+LOCATION_FIELDS = ('address', 'district', 'direction', 'city')
+
+def parse_retry_after(headers):
+    """Return the Retry-After delay in seconds (capped at MAX_RETRY_AFTER), if the server sent a finite number"""
+    try:
+        retry_after = float(headers.get("Retry-After", ""))
+    except ValueError:
+        return None
+    
+    if not math.isfinite(retry_after):
+        return None
+    return min(max(retry_after, 0), MAX_RETRY_AFTER)
+
 def convert_to_riyadh_datetime(timestamp):
     """Convert timestamp to Riyadh timezone datetime and return as ISO string"""
     if not timestamp:
         return None
     
-    riyadh_tz = pytz.timezone('Asia/Riyadh')
-    
     try:
-        # Handle Unix timestamp (seconds since epoch)
+        # Fast path: plain int/float Unix timestamps (seconds since epoch), converted straight into Riyadh time
+        if type(timestamp) in (int, float):
+            return datetime.fromtimestamp(timestamp, tz=RIYADH_TZ).isoformat()
+        
+        # Other numbers (e.g. bools), then strings
         if isinstance(timestamp, (int, float)):
-            dt = datetime.fromtimestamp(timestamp, tz=pytz.UTC)
-        # Handle string timestamps
+            dt = datetime.fromtimestamp(timestamp, tz=UTC_TZ)
         elif isinstance(timestamp, str):
-            # Try parsing as ISO format first
-            try:
-                dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-            except ValueError:
-                # Try parsing as Unix timestamp string
+            # Long all-digit strings can only be Unix timestamps (basic ISO dates have 8 digits)
+            if timestamp.isdigit() and len(timestamp) > 8:
+                dt = datetime.fromtimestamp(int(timestamp), tz=UTC_TZ)
+            else:
+                # Try parsing as ISO format first, then as a Unix timestamp string
                 try:
-                    dt = datetime.fromtimestamp(float(timestamp), tz=pytz.UTC)
+                    dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
                 except ValueError:
-                    return None
+                    dt = datetime.fromtimestamp(float(timestamp), tz=UTC_TZ)
         else:
             return None
         
         # Convert to Riyadh timezone and return as ISO string
-        riyadh_dt = dt.astimezone(riyadh_tz)
-        return riyadh_dt.isoformat()
-    except (ValueError, OSError):
+        return dt.astimezone(RIYADH_TZ).isoformat()
+    except (ValueError, OSError, OverflowError):
+        return None
+
+def parse_number(value):
+    """Return value as a number, or None if it is missing or not numeric"""
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
         return None
 
 def filter_listings(listings):
@@ -375,15 +479,10 @@ def filter_listings(listings):
     filtered_out_count = 0
     
     for listing in listings:
-        # Check room count (2-4 rooms only)
-        rooms = listing.get('rooms')
-        if rooms is None or not (MIN_ROOMS <= rooms <= MAX_ROOMS):
-            filtered_out_count += 1
-            continue
-        
-        # Check price (not more than MAX_PRICE)
-        price = listing.get('price')
-        if price is None or price > MAX_PRICE:
+        # Check room count (2-4 rooms only) and price (not more than MAX_PRICE); numeric strings are accepted
+        rooms = parse_number(listing.get('rooms'))
+        price = parse_number(listing.get('price'))
+        if rooms is None or not (MIN_ROOMS <= rooms <= MAX_ROOMS) or price is None or not price <= MAX_PRICE:
             filtered_out_count += 1
             continue
         
@@ -393,82 +492,17 @@ def filter_listings(listings):
         listing['last_update_riyadh'] = convert_to_riyadh_datetime(listing.get('last_update'))
         
         # Add full listing URL (using base URL from environment)
-        base_url = API_URL.replace('/graphql', '')
-        listing['full_url'] = f"{base_url}{listing.get('path', '')}"
+        listing['full_url'] = f"{BASE_URL}{listing.get('path', '')}"
         
-        # Reorder fields for better readability
-        reordered_listing = {
-            # Most important fields first
-            'rooms': listing.get('rooms'),
-            'price': listing.get('price'),
-            'location': {
-                'lat': listing.get('location', {}).get('lat'),
-                'lng': listing.get('location', {}).get('lng'),
-                'address': listing.get('address'),
-                'district': listing.get('district'),
-                'direction': listing.get('direction'),
-                'city': listing.get('city')
-            },
-            'create_time_riyadh': listing['create_time_riyadh'],
-            'published_at_riyadh': listing['published_at_riyadh'],
-            'last_update_riyadh': listing['last_update_riyadh'],
-            'full_url': listing['full_url'],
-            
-            # Additional useful fields
-            'id': listing.get('id'),
-            'title': listing.get('title'),
-            'area': listing.get('area'),
-            'beds': listing.get('beds'),
-            'wc': listing.get('wc'),
-            'furnished': listing.get('furnished'),
-            'ac': listing.get('ac'),
-            'lift': listing.get('lift'),
-            'age': listing.get('age'),
-            'fl': listing.get('fl'),
-            'livings': listing.get('livings'),
-            'ketchen': listing.get('ketchen'),
-            'backyard': listing.get('backyard'),
-            'stairs': listing.get('stairs'),
-            'stores': listing.get('stores'),
-            'men_place': listing.get('men_place'),
-            'women_place': listing.get('women_place'),
-            'family': listing.get('family'),
-            'rent_period': listing.get('rent_period'),
-            'street_direction': listing.get('street_direction'),
-            'status': listing.get('status'),
-            'published': listing.get('published'),
-            'content': listing.get('content'),
-            'rnpl_monthly_price': listing.get('rnpl_monthly_price'),
-            'price_2_payments': listing.get('price_2_payments'),
-            'price_4_payments': listing.get('price_4_payments'),
-            'price_12_payments': listing.get('price_12_payments'),
-            'range_price': listing.get('range_price'),
-            'original_range_price': listing.get('original_range_price'),
-            'plan_no': listing.get('plan_no'),
-            'parcel_no': listing.get('parcel_no'),
-            'extra_unit': listing.get('extra_unit'),
-            'family_section': listing.get('family_section'),
-            'fb': listing.get('fb'),
-            'refresh': listing.get('refresh'),
-            'user': listing.get('user'),
-            'path': listing.get('path'),
-            'uri': listing.get('uri'),
-            
-            # Original timestamp fields (kept for reference)
-            'create_time': listing.get('create_time'),
-            'published_at': listing.get('published_at'),
-            'last_update': listing.get('last_update'),
-            'refresh': listing.get('refresh'),
-            
-            # Other fields
-            'category': listing.get('category'),
-            'city_id': listing.get('city_id'),
-            'direction_id': listing.get('direction_id'),
-            'district_id': listing.get('district_id'),
-            'province_id': listing.get('province_id'),
-            'apts': listing.get('apts'),
-            '__typename': listing.get('__typename')
+        # Fold address fields into location, then put the most important fields first
+        location = listing.get('location') or {}
+        listing['location'] = {
+            'lat': location.get('lat'),
+            'lng': location.get('lng'),
+            **{field: listing.pop(field, None) for field in LOCATION_FIELDS}
         }
+        reordered_listing = {field: listing.get(field) for field in PRIORITY_FIELDS}
+        reordered_listing.update((key, value) for key, value in listing.items() if key not in reordered_listing)
         
         filtered_listings.append(reordered_listing)
     
@@ -478,79 +512,53 @@ def filter_listings(listings):
 # SCRAPING FUNCTIONS
 # =============================================================================
 
-def scrape_district(api_client, district_info, after_date):
+async def scrape_district(api_client, district_info, after_date):
     """Scrape a single district for new listings"""
     
     district_id = district_info["id"]
     district_name = district_info["name"]
     direction_id = district_info["direction_id"]
     
-    print(f"\n🏠 Scraping: {district_name} (ID: {district_id}, Direction: {direction_id})")
-    print("-" * 50)
+    logger.info("🏠 Scraping: %s (ID: %s, Direction: %s)", district_name, district_id, direction_id)
     
-    # Try both family=0 and family=1 to see which gives more results
-    print("🔍 Testing different family filters...")
+    # Fetch all family types in one pass and split them locally
+    data = await api_client.get_all_new_listings(district_id, direction_id, after_date)
     
-    # Try singles first
-    data_singles = api_client.get_all_new_listings(district_id, direction_id, after_date, family=0)
-    singles_count = len(data_singles.get('data', {}).get('Web', {}).get('find', {}).get('listings', [])) if data_singles else 0
+    if not data:
+        logger.error("❌ Failed to fetch data for district %s (%s)", district_name, district_id)
+        return None
     
-    # Try families
-    data_families = api_client.get_all_new_listings(district_id, direction_id, after_date, family=1)
-    families_count = len(data_families.get('data', {}).get('Web', {}).get('find', {}).get('listings', [])) if data_families else 0
+    all_listings = data['data']['Web']['find']['listings']
+    singles = [listing for listing in all_listings if listing.get('family') == 0]
+    families = [listing for listing in all_listings if listing.get('family') == 1]
     
-    print(f"Singles listings: {singles_count}")
-    print(f"Families listings: {families_count}")
+    logger.debug("%s: %d singles listings, %d families listings", district_name, len(singles), len(families))
     
     # Use the one with more listings
-    if families_count > singles_count:
-        data = data_families
+    if len(families) > len(singles):
+        listings = families
         family_type = "families"
-        print(f"✅ Using families data ({families_count} listings)")
     else:
-        data = data_singles
+        listings = singles
         family_type = "singles"
-        print(f"✅ Using singles data ({singles_count} listings)")
-    
-    if not data:
-        print(f"❌ Failed to fetch data for district {district_id}")
-        return None
     
-    # Extract listings
-    listings = data.get('data', {}).get('Web', {}).get('find', {}).get('listings', [])
     total_listings = len(listings)
     
-    print(f"📊 Results:")
-    print(f"  Total new listings fetched: {total_listings}")
-    print(f"  Family type: {family_type}")
-    
     if total_listings == 0:
-        print("ℹ️ No new listings found for this district")
+        logger.info("ℹ️ No new listings found for %s", district_name)
         return None
     
     # Apply filters
-    print(f"🔍 Applying filters:")
-    print(f"  Room count: {MIN_ROOMS}-{MAX_ROOMS} rooms")
-    print(f"  Max price: {MAX_PRICE:,} SAR")
-    
     filtered_listings, filtered_out_count = filter_listings(listings)
     
-    print(f"  Filtered out: {filtered_out_count} listings")
-    print(f"  Remaining: {len(filtered_listings)} listings")
-    
     if not filtered_listings:
-        print("❌ No listings match the filtering criteria!")
+        logger.info("❌ No %s listings in %s match the filtering criteria (%d fetched)", family_type, district_name, total_listings)
         return None
     
-    # Calculate distances from office using Google Maps API
-    print(f"🌍 Calculating distances from office for {len(filtered_listings)} filtered listings...")
-    try:
-        google_maps = GoogleMapsService()
-        filtered_listings = google_maps.add_distance_to_listings(filtered_listings)
-        print(f"✅ Distance calculation completed")
-    except Exception as e:
-        print(f"⚠️ Distance calculation failed: {e}")
-        print("Continuing without distance data...")
+    logger.info(
+        "✅ %s: %d of %d new %s listings match the filters (%d filtered out)",
+        district_name, len(filtered_listings), total_listings, family_type, filtered_out_count
+    )
     
     return {
         "data": data,
@@ -603,7 +611,7 @@ def save_district_data(district_data, output_dir):
                     "listings": district_data["filtered_listings"],
                     "__typename": "WebResults"
                 },
-                "sov": district_data["data"].get('data', {}).get('Web', {}).get('sov', {"total": 0, "listings": [], "__typename": "WebResults"}),
+                "sov": district_data["data"]["data"]["Web"]["sov"],
                 "__typename": "WebQryOps"
             }
         }
@@ -613,23 +621,51 @@ def save_district_data(district_data, output_dir):
     filename = f"{district_name}_listings.json"
     filepath = output_dir / filename
     
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(output_data, f, ensure_ascii=False, indent=2)
+    filepath.write_bytes(orjson.dumps(output_data, option=orjson.OPT_INDENT_2))
     
-    print(f"💾 Saved to: {filename}")
-    print(f"📁 File size: {filepath.stat().st_size / 1024 / 1024:.1f} MB")
+    logger.info("💾 Saved to: %s (%.1f MB)", filename, filepath.stat().st_size / 1024 / 1024)
     
     return filepath
 
-def convert_to_excel(json_dir, excel_dir):
-    """Convert JSON files to Excel format"""
+def add_distances(district_results):
+    """Add office distances to the filtered listings of all districts in one batch"""
+    
+    all_listings = [
+        listing
+        for district_data in district_results
+        for listing in district_data["filtered_listings"]
+    ]
+    
+    if not all_listings:
+        return
+    
+    # Calculate distances from office using Google Maps API
+    logger.info("🌍 Calculating distances from office for %d filtered listings...", len(all_listings))
+    try:
+        google_maps = GoogleMapsService()
+        google_maps.add_distance_to_listings(all_listings)
+        logger.info("✅ Distance calculation completed")
+    except Exception as e:
+        logger.warning("⚠️ Distance calculation failed: %s", e)
+        logger.warning("Continuing without distance data...")
+
+def convert_to_excel(json_file, excel_dir):
+    """Convert a saved district JSON file to the configured export formats"""
     
-    print(f"\n📊 Converting JSON files to Excel...")
-    print("=" * 50)
+    # Create a converter for the date-based directories
+    converter = ExcelConverterService(input_dir=str(json_file.parent), output_dir=str(excel_dir), formats=EXPORT_FORMATS)
+    return converter.convert_district_file(json_file)
+
+async def scrape_districts(target_districts, after_date):
+    """Scrape all districts concurrently over a shared API client"""
     
-    # Create a custom converter for the date-based directory
-    converter = ExcelConverterService(input_dir=str(json_dir), output_dir=str(excel_dir))
-    converter.convert_all_listings()
+    async with DistrictsAPIClient() as api_client:
+        tasks = [scrape_district(api_client, district_info, after_date) for district_info in target_districts]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+def configure_logging():
+    """Log plain messages to stderr at the configured level"""
+    logging.basicConfig(level=LOG_LEVEL, format="%(message)s")
 
 # =============================================================================
 # MAIN FUNCTION
@@ -638,8 +674,10 @@ def convert_to_excel(json_dir, excel_dir):
 def main():
     """Main function - scrape new listings for selected districts"""
     
-    print("🏠 DISTRICTS SCRAPER")
-    print("=" * 60)
+    configure_logging()
+    
+    logger.info("🏠 DISTRICTS SCRAPER")
+    logger.info("=" * 60)
     
     # Get configuration
     after_date = AFTER_DATE
@@ -647,70 +685,83 @@ def main():
     json_dir, excel_dir = DistrictsConfig.get_output_dirs()
     scrape_date = DistrictsConfig.get_scrape_date()
     
-    print(f"📅 Scraping date: {scrape_date}")
-    print(f"📅 After date filter: {after_date}")
-    print(f"🏘️ Target districts: {len(target_districts)}")
-    print(f"📂 JSON output: {json_dir}")
-    print(f"📂 Excel output: {excel_dir}")
-    print("-" * 60)
+    logger.info("📅 Scraping date: %s", scrape_date)
+    logger.info("📅 After date filter: %s", after_date)
+    logger.info("🏘️ Target districts: %d", len(target_districts))
+    logger.info("📂 JSON output: %s", json_dir)
+    logger.info("📂 Excel output: %s", excel_dir)
+    logger.info("🗂️ Export formats: %s", ', '.join(fmt for fmt in SUPPORTED_FORMATS if fmt in EXPORT_FORMATS))
+    logger.info("🔍 Filters: %s-%s rooms, max price %s SAR", MIN_ROOMS, MAX_ROOMS, format(MAX_PRICE, ','))
+    logger.info("-" * 60)
     
     # Create output directories
     json_dir.mkdir(parents=True, exist_ok=True)
     excel_dir.mkdir(parents=True, exist_ok=True)
     
-    # Initialize API client
-    api_client = DistrictsAPIClient()
+    # Scrape all districts concurrently
+    results = asyncio.run(scrape_districts(target_districts, after_date))
+    
+    # Calculate distances for every scraped district together
+    add_distances([data for data in results if data and not isinstance(data, Exception)])
     
-    # Scrape each district
     successful_districts = []
     failed_districts = []
+    converted_count = 0
     
-    for district_info in target_districts:
-        try:
-            district_data = scrape_district(api_client, district_info, after_date)
+    # Save each district here and convert the saved files in worker processes (only paths are pickled)
+    with ProcessPoolExecutor(initializer=configure_logging) as executor:
+        excel_futures = []
+        
+        for district_info, district_data in zip(target_districts, results):
+            if isinstance(district_data, Exception):
+                logger.error("❌ Error scraping %s: %s", district_info['name'], district_data)
+                failed_districts.append(district_info)
+                continue
             
-            if district_data:
+            try:
                 json_file = save_district_data(district_data, json_dir)
-                if json_file:
-                    successful_districts.append(district_info)
-                    print(f"✅ Successfully scraped: {district_info['name']}")
-                else:
-                    failed_districts.append(district_info)
+            except Exception as e:
+                logger.error("❌ Error saving %s: %s", district_info['name'], e)
+                json_file = None
+            
+            if json_file:
+                successful_districts.append(district_info)
+                logger.info("✅ Successfully scraped: %s", district_info['name'])
+                excel_futures.append(executor.submit(convert_to_excel, json_file, excel_dir))
             else:
                 failed_districts.append(district_info)
-                
-        except Exception as e:
-            print(f"❌ Error scraping {district_info['name']}: {e}")
-            failed_districts.append(district_info)
-    
-    # Convert to Excel if we have successful scrapes
-    if successful_districts:
-        convert_to_excel(json_dir, excel_dir)
+        
+        for future in as_completed(excel_futures):
+            output_files = future.result()
+            if output_files:
+                logger.info("📊 Created: %s", ExcelConverterService.describe_outputs(output_files))
+                converted_count += 1
     
     # Summary
-    print("\n" + "=" * 60)
-    print("📊 SCRAPING SUMMARY")
-    print("=" * 60)
-    print(f"✅ Successfully scraped: {len(successful_districts)} districts")
-    print(f"❌ Failed districts: {len(failed_districts)}")
-    print(f"📅 Scrape date: {scrape_date}")
-    print(f"📅 After date filter: {after_date}")
+    logger.info("\n" + "=" * 60)
+    logger.info("📊 SCRAPING SUMMARY")
+    logger.info("=" * 60)
+    logger.info("✅ Successfully scraped: %d districts", len(successful_districts))
+    logger.info("❌ Failed districts: %d", len(failed_districts))
+    logger.info("📊 Converted to %s: %d districts", '/'.join(fmt for fmt in SUPPORTED_FORMATS if fmt in EXPORT_FORMATS), converted_count)
+    logger.info("📅 Scrape date: %s", scrape_date)
+    logger.info("📅 After date filter: %s", after_date)
     
     if successful_districts:
-        print(f"\n✅ Successful districts:")
+        logger.info("\n✅ Successful districts:")
         for district in successful_districts:
-            print(f"  - {district['name']} (ID: {district['id']})")
+            logger.info("  - %s (ID: %s)", district['name'], district['id'])
     
     if failed_districts:
-        print(f"\n❌ Failed districts:")
+        logger.info("\n❌ Failed districts:")
         for district in failed_districts:
-            print(f"  - {district['name']} (ID: {district['id']})")
+            logger.info("  - %s (ID: %s)", district['name'], district['id'])
     
-    print(f"\n📁 Output directories:")
-    print(f"  JSON: {json_dir}")
-    print(f"  Excel: {excel_dir}")
+    logger.info("\n📁 Output directories:")
+    logger.info("  JSON: %s", json_dir)
+    logger.info("  Excel: %s", excel_dir)
     
-    print("\n✅ Districts scraping completed!")
+    logger.info("\n✅ Districts scraping completed!")
 
 if __name__ == "__main__":
     main()
@@ -4,20 +4,118 @@ Excel/CSV Converter Service
 Converts apartment listings JSON files to Excel and CSV formats
 """
 
-import json
+import codecs
+import csv
+import orjson
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+import xlsxwriter
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 import os
 
+# Nested listing fields included in the export (after renaming)
+EXPORTED_NESTED_COLUMNS = {
+    'location_address',
+    'location_lat',
+    'location_lng',
+    'location_district',
+    'location_direction',
+    'location_city',
+    'user_name',
+    'user_phone',
+    'user_bml_license',
+    'user_bml_url'
+}
+
+# Low-cardinality columns stored as categoricals (one string per distinct value)
+CATEGORICAL_COLUMNS = (
+    'location_district',
+    'location_city',
+    'distance_status',
+    'user_name',
+    'user_phone'
+)
+
+# Output formats the converter can write, and the ones written by default
+SUPPORTED_FORMATS = ('xlsx', 'csv', 'parquet', 'feather')
+DEFAULT_FORMATS = frozenset({'csv', 'parquet'})
+
+# Exported nested listing fields, mapped from their source keys to column names
+_LOC_MAP = {
+    'address': 'location_address',
+    'lat': 'location_lat',
+    'lng': 'location_lng',
+    'district': 'location_district',
+    'direction': 'location_direction',
+    'city': 'location_city'
+}
+_DIST_MAP = {
+    'distance_km': 'distance_from_office_km',
+    'duration_text': 'distance_duration',
+    'distance_meters': 'distance_meters',
+    'duration_seconds': 'distance_seconds',
+    'status': 'distance_status'
+}
+_USER_MAP = {
+    'name': 'user_name',
+    'phone': 'user_phone',
+    'bml_license_number': 'user_bml_license',
+    'bml_url': 'user_bml_url'
+}
+
+def _flatten_listing(listing: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten a listing into export columns using the fixed location/distance/user key maps"""
+    
+    flattened = {}
+    
+    # Every mapped column is written whenever its section is a dict, so the export schema
+    # doesn't depend on the data (e.g. distance columns stay when distances failed)
+    location = listing.get('location')
+    if isinstance(location, dict):
+        flattened.update({target: location.get(source) for source, target in _LOC_MAP.items()})
+        
+        distance = location.get('distance_from_office')
+        if not isinstance(distance, dict):
+            distance = {}
+        flattened.update({target: distance.get(source) for source, target in _DIST_MAP.items()})
+    
+    user = listing.get('user')
+    if isinstance(user, dict):
+        flattened.update({target: user.get(source) for source, target in _USER_MAP.items()})
+    
+    # Top-level fields; a null location/user is kept as its own column
+    flattened.update({key: value for key, value in listing.items() if not isinstance(value, dict)})
+    return flattened
+
+def _convert_one(input_dir: str, output_dir: str, formats: set,
+                 job: Tuple[Path, Dict[str, Path]]) -> Dict[str, Path]:
+    """Convert one (file_path, output_paths) job in a worker process (top-level so it can be pickled)"""
+    
+    file_path, output_paths = job
+    converter = ExcelConverterService(input_dir=input_dir, output_dir=output_dir, formats=formats)
+    return converter.convert_district_file(file_path, output_paths)
+
 class ExcelConverterService:
     """Service for converting apartment listings to Excel and CSV formats"""
     
-    def __init__(self, input_dir: str = "output", output_dir: str = "excel_output"):
+    def __init__(self, input_dir: str = "output", output_dir: str = "excel_output",
+                 formats: Optional[set] = None):
         self.input_dir = Path(input_dir)
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
         
+        # CSV and Parquet by default; xlsx is by far the slowest format, so it is opt-in
+        self.formats = set(DEFAULT_FORMATS if formats is None else formats)
+        unknown_formats = self.formats - set(SUPPORTED_FORMATS)
+        if unknown_formats:
+            raise ValueError(f"Unsupported output formats: {', '.join(sorted(unknown_formats))}")
+        
         # Define the preferred column order
         self.priority_columns = [
             'rooms',
@@ -34,6 +132,7 @@ class ExcelConverterService:
             'published_at_riyadh',
             'last_update_riyadh'
         ]
+        self._priority_set = set(self.priority_columns)
     
     def convert_all_listings(self):
         """Convert all district listing files to Excel and CSV"""
@@ -47,28 +146,38 @@ class ExcelConverterService:
         print(f"📁 Found {len(listing_files)} district listing files")
         print(f"📂 Input directory: {self.input_dir}")
         print(f"📂 Output directory: {self.output_dir}")
+        print(f"🗂️ Output formats: {', '.join(fmt for fmt in SUPPORTED_FORMATS if fmt in self.formats)}")
         print("-" * 50)
         
         converted_count = 0
         failed_count = 0
         
-        for file_path in listing_files:
-            try:
-                print(f"🔄 Processing: {file_path.name}")
-                
-                # Convert to Excel and CSV
-                excel_file, csv_file = self.convert_district_file(file_path)
-                
-                if excel_file and csv_file:
-                    print(f"✅ Created: {excel_file.name} & {csv_file.name}")
-                    converted_count += 1
-                else:
-                    print(f"❌ Failed to convert: {file_path.name}")
-                    failed_count += 1
+        # Resolve every output path up front so workers go straight to I/O
+        jobs = [(file_path, self.output_paths(file_path)) for file_path in listing_files]
+        
+        # District files are independent, so convert them on all CPU cores
+        convert_one = partial(_convert_one, str(self.input_dir), str(self.output_dir), self.formats)
+        max_workers = min(os.cpu_count() or 1, len(jobs)) or 1
+        
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [(job[0], executor.submit(convert_one, job)) for job in jobs]
+            
+            for file_path, future in futures:
+                try:
+                    print(f"🔄 Processing: {file_path.name}")
                     
-            except Exception as e:
-                print(f"❌ Error processing {file_path.name}: {e}")
-                failed_count += 1
+                    output_files = future.result()
+                    
+                    if output_files:
+                        print(f"✅ Created: {self.describe_outputs(output_files)}")
+                        converted_count += 1
+                    else:
+                        print(f"❌ Failed to convert: {file_path.name}")
+                        failed_count += 1
+                        
+                except Exception as e:
+                    print(f"❌ Error processing {file_path.name}: {e}")
+                    failed_count += 1
         
         print("\n" + "=" * 50)
         print("📊 CONVERSION SUMMARY")
@@ -77,127 +186,188 @@ class ExcelConverterService:
         print(f"❌ Failed conversions: {failed_count} files")
         print(f"📁 Output directory: {self.output_dir}")
     
-    def convert_district_file(self, file_path: Path) -> tuple[Optional[Path], Optional[Path]]:
-        """Convert a single district JSON file to Excel and CSV"""
+    def output_paths(self, file_path: Path) -> Dict[str, Path]:
+        """Output file paths for a district JSON file, one per configured format, in a stable order"""
+        
+        district_name = file_path.stem.replace('_listings', '')
+        return {
+            fmt: self.output_dir / f"{district_name}_listings.{fmt}"
+            for fmt in SUPPORTED_FORMATS
+            if fmt in self.formats
+        }
+    
+    def convert_district_file(self, file_path: Path,
+                              output_paths: Optional[Dict[str, Path]] = None) -> Dict[str, Path]:
+        """Convert a single district JSON file to the configured formats, returning {format: path}"""
+        
+        if output_paths is None:
+            output_paths = self.output_paths(file_path)
         
         try:
             # Load JSON data
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data = orjson.loads(file_path.read_bytes())
             
             # Extract listings
-            listings = data.get('data', {}).get('Web', {}).get('find', {}).get('listings', [])
+            try:
+                listings = data['data']['Web']['find']['listings']
+            except KeyError:
+                listings = []
             
             if not listings:
                 print(f"⚠️ No listings found in {file_path.name}")
-                return None, None
+                return {}
+            
+            # CSV-only exports don't need a DataFrame at all
+            if output_paths.keys() == {'csv'}:
+                self._write_csv_stream(listings, output_paths['csv'])
+                return output_paths
             
             # Convert to DataFrame
             df = self.listings_to_dataframe(listings)
             
-            # Get district name from filename
-            district_name = file_path.stem.replace('_listings', '')
-            
-            # Create output filenames
-            excel_filename = f"{district_name}_listings.xlsx"
-            csv_filename = f"{district_name}_listings.csv"
-            
-            excel_path = self.output_dir / excel_filename
-            csv_path = self.output_dir / csv_filename
+            writers = {
+                'xlsx': self._write_excel_fast,
+                'csv': self._write_csv_fast,
+                'parquet': self._write_parquet,
+                'feather': self._write_feather
+            }
             
-            # Save as Excel
-            df.to_excel(excel_path, index=False, engine='openpyxl')
+            # Write each requested format
+            for fmt, output_path in output_paths.items():
+                writers[fmt](df, output_path)
             
-            # Save as CSV
-            df.to_csv(csv_path, index=False, encoding='utf-8-sig')
-            
-            return excel_path, csv_path
+            return output_paths
             
         except Exception as e:
             print(f"❌ Error converting {file_path.name}: {e}")
-            return None, None
+            return {}
     
     def listings_to_dataframe(self, listings: List[Dict]) -> pd.DataFrame:
         """Convert listings to DataFrame with proper column ordering"""
         
-        # Flatten the listings data
-        flattened_listings = []
-        
-        for listing in listings:
-            flattened = self.flatten_listing(listing)
-            flattened_listings.append(flattened)
+        # Flatten listings and build the frame column by column
+        rows = [_flatten_listing(listing) for listing in listings]
+        columns = {column: [row.get(column) for row in rows] for column in self._export_columns(rows)}
+        df = pd.DataFrame(columns, copy=False)
         
-        # Create DataFrame
-        df = pd.DataFrame(flattened_listings)
+        # Keep whole-number columns as integers even when some listings lack them
+        df = df.convert_dtypes()
         
         # Reorder columns with priority columns first
         df = self.reorder_columns(df)
         
+        # Repeated district/city/status/user values are stored once per category
+        # (text columns only: mixed-type categories cannot be written by Arrow)
+        for col in CATEGORICAL_COLUMNS:
+            if col in df and isinstance(df[col].dtype, pd.StringDtype):
+                df[col] = df[col].astype('category')
+        
         return df
     
-    def flatten_listing(self, listing: Dict) -> Dict:
-        """Flatten a single listing dictionary"""
-        
-        flattened = {}
-        
-        # Copy all top-level fields
-        for key, value in listing.items():
-            if key == 'location':
-                # Flatten location data
-                if isinstance(value, dict):
-                    flattened['location_address'] = value.get('address', '')
-                    flattened['location_lat'] = value.get('lat', '')
-                    flattened['location_lng'] = value.get('lng', '')
-                    flattened['location_district'] = value.get('district', '')
-                    flattened['location_direction'] = value.get('direction', '')
-                    flattened['location_city'] = value.get('city', '')
-                    
-                    # Flatten distance data
-                    distance_info = value.get('distance_from_office', {})
-                    if isinstance(distance_info, dict):
-                        flattened['distance_from_office_km'] = distance_info.get('distance_km', '')
-                        flattened['distance_duration'] = distance_info.get('duration_text', '')
-                        flattened['distance_meters'] = distance_info.get('distance_meters', '')
-                        flattened['distance_seconds'] = distance_info.get('duration_seconds', '')
-                        flattened['distance_status'] = distance_info.get('status', '')
-                else:
-                    flattened['location'] = value
-            elif key == 'user':
-                # Flatten user data
-                if isinstance(value, dict):
-                    flattened['user_name'] = value.get('name', '')
-                    flattened['user_phone'] = value.get('phone', '')
-                    flattened['user_bml_license'] = value.get('bml_license_number', '')
-                    flattened['user_bml_url'] = value.get('bml_url', '')
-                else:
-                    flattened['user'] = value
-            else:
-                flattened[key] = value
-        
-        return flattened
+    @staticmethod
+    def _is_exported(column: str) -> bool:
+        """Whether a flattened column is part of the export"""
+        return not column.startswith(('location_', 'user_')) or column in EXPORTED_NESTED_COLUMNS
+    
+    def _export_columns(self, rows: List[Dict[str, Any]]) -> List[str]:
+        """Collect exported column names across flattened rows, in first-seen order"""
+        
+        all_columns = dict.fromkeys(column for row in rows for column in row)
+        return [column for column in all_columns if self._is_exported(column)]
     
     def reorder_columns(self, df: pd.DataFrame) -> pd.DataFrame:
         """Reorder DataFrame columns with priority columns first"""
         
-        # Get all columns
-        all_columns = list(df.columns)
+        return df[self._order_columns(list(df.columns))]
+    
+    def _order_columns(self, all_columns: List[str]) -> List[str]:
+        """Order column names with priority columns first, then the rest alphabetically"""
         
-        # Find priority columns that exist in the DataFrame
+        # Find priority columns that exist in the data
         existing_priority_columns = [col for col in self.priority_columns if col in all_columns]
         
         # Get remaining columns (not in priority list)
-        remaining_columns = [col for col in all_columns if col not in self.priority_columns]
+        remaining_columns = [col for col in all_columns if col not in self._priority_set]
         
         # Sort remaining columns alphabetically
         remaining_columns.sort()
         
         # Combine: priority columns first, then remaining columns
-        ordered_columns = existing_priority_columns + remaining_columns
+        return existing_priority_columns + remaining_columns
+    
+    def _write_excel_fast(self, df: pd.DataFrame, excel_path: Path):
+        """Stream DataFrame rows into an xlsx file in constant-memory mode"""
         
-        # Reorder DataFrame
-        df = df[ordered_columns]
+        # Excel has no missing-value or container types: blank out NA and stringify lists/dicts
+        values = df.astype(object)
+        for col in values.columns:
+            if df[col].dtype == object:
+                values[col] = pd.Series(
+                    [str(v) if isinstance(v, (list, dict)) else v for v in values[col]],
+                    index=values.index,
+                    dtype=object
+                )
+        values = values.where(values.notna(), None)
         
-        return df
+        workbook = xlsxwriter.Workbook(str(excel_path), {'constant_memory': True})
+        try:
+            worksheet = workbook.add_worksheet('Sheet1')
+            worksheet.write_row(0, 0, list(df.columns), workbook.add_format({'bold': True}))
+            
+            # constant_memory flushes each row as the next one starts, so rows must be written in order
+            for row_index, row in enumerate(values.itertuples(index=False, name=None), start=1):
+                worksheet.write_row(row_index, 0, row)
+        finally:
+            workbook.close()
+    
+    def _to_arrow_table(self, df: pd.DataFrame, text_bools: bool = False) -> pa.Table:
+        """Convert a DataFrame to an Arrow table, storing mixed-type columns as text like to_csv does"""
+        
+        columns = {}
+        for col in df.columns:
+            series = df[col]
+            if series.dtype == object or (text_bools and pd.api.types.is_bool_dtype(series)):
+                series = series.map(str, na_action='ignore')
+            columns[col] = series
+        
+        return pa.Table.from_pandas(pd.DataFrame(columns), preserve_index=False)
+    
+    def _write_csv_fast(self, df: pd.DataFrame, csv_path: Path):
+        """Write a UTF-8 CSV with BOM (Excel-friendly) using Arrow's C++ CSV writer"""
+        
+        table = self._to_arrow_table(df, text_bools=True)
+        write_options = pacsv.WriteOptions(include_header=True)
+        
+        with open(csv_path, 'wb') as f:
+            f.write(codecs.BOM_UTF8)
+            pacsv.write_csv(table, f, write_options=write_options)
+    
+    def _write_csv_stream(self, listings: List[Dict], csv_path: Path):
+        """Write listings straight to a UTF-8 CSV with BOM, without building a DataFrame"""
+        
+        rows = [_flatten_listing(listing) for listing in listings]
+        columns = self._order_columns(self._export_columns(rows))
+        
+        with open(csv_path, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            writer.writerows([row.get(column) for column in columns] for row in rows)
+    
+    def _write_parquet(self, df: pd.DataFrame, parquet_path: Path):
+        """Write a snappy-compressed Parquet file"""
+        
+        pq.write_table(self._to_arrow_table(df), parquet_path, compression='snappy')
+    
+    def _write_feather(self, df: pd.DataFrame, feather_path: Path):
+        """Write a Feather (Arrow IPC) file"""
+        
+        feather.write_feather(self._to_arrow_table(df), feather_path)
+    
+    @staticmethod
+    def describe_outputs(output_files: Dict[str, Path]) -> str:
+        """Join created output file names for log messages"""
+        
+        return " & ".join(path.name for path in output_files.values())
     
     def convert_specific_file(self, filename: str):
         """Convert a specific file by name"""
@@ -209,9 +379,9 @@ class ExcelConverterService:
             return
         
         print(f"🔄 Converting specific file: {filename}")
-        excel_file, csv_file = self.convert_district_file(file_path)
+        output_files = self.convert_district_file(file_path)
         
-        if excel_file and csv_file:
-            print(f"✅ Created: {excel_file.name} & {csv_file.name}")
+        if output_files:
+            print(f"✅ Created: {self.describe_outputs(output_files)}")
         else:
             print(f"❌ Failed to convert: {filename}")
@@ -4,31 +4,140 @@ Google Maps Distance Matrix API Service
 Calculates driving distances and travel times from office to apartment listings
 """
 
+import asyncio
 import os
+import re
+import sqlite3
 import time
-import requests
+import aiohttp
+from pathlib import Path
 from typing import List, Dict, Optional, Tuple
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
+class DistanceCache:
+    """On-disk SQLite cache of distance results keyed by rounded office and apartment coordinates"""
+    
+    def __init__(self, path: str = ".cache/gmaps_distances.sqlite", ttl_days: int = 30):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_days * 24 * 60 * 60
+        
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS distances (
+                key TEXT PRIMARY KEY,
+                distance_km REAL,
+                distance_meters INTEGER,
+                duration_text TEXT,
+                duration_seconds INTEGER,
+                status TEXT,
+                cached_at REAL
+            )"""
+        )
+    
+    @staticmethod
+    def make_key(origin: Tuple[float, float], lat: float, lng: float) -> str:
+        """Build the cache key for an office -> apartment pair (~1 m precision)"""
+        origin_lat, origin_lng = origin
+        return (f"{round(float(origin_lat), 5)},{round(float(origin_lng), 5)}"
+                f"->{round(float(lat), 5)},{round(float(lng), 5)}")
+    
+    def get_many(self, keys: List[str]) -> Dict[str, Dict]:
+        """
+        Look up cached results that are still within the TTL
+        
+        Args:
+            keys: Cache keys built with make_key
+            
+        Returns:
+            Dictionary mapping each cached key to its distance result
+        """
+        min_cached_at = time.time() - self.ttl_seconds
+        hits = {}
+        
+        # Stay well below SQLite's limit on bound parameters per statement
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = self.connection.execute(
+                f"""SELECT key, distance_km, distance_meters, duration_text, duration_seconds, status
+                    FROM distances
+                    WHERE cached_at >= ? AND key IN ({', '.join('?' * len(chunk))})""",
+                [min_cached_at, *chunk]
+            )
+            for key, distance_km, distance_meters, duration_text, duration_seconds, status in rows:
+                hits[key] = {
+                    'distance_km': distance_km,
+                    'distance_meters': distance_meters,
+                    'duration_text': duration_text,
+                    'duration_seconds': duration_seconds,
+                    'status': status
+                }
+        
+        return hits
+    
+    def set_many(self, results: Dict[str, Dict]):
+        """Store successful distance results, replacing older entries"""
+        now = time.time()
+        rows = [
+            (key, result['distance_km'], result['distance_meters'], result['duration_text'],
+             result['duration_seconds'], result['status'], now)
+            for key, result in results.items()
+            if result['status'] == 'OK'
+        ]
+        
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO distances VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+class RateLimiter:
+    """Spaces out request starts to stay within a requests-per-second quota"""
+    
+    def __init__(self, requests_per_second: float):
+        self.interval = 1 / requests_per_second
+        self.next_slot = 0.0
+    
+    async def wait(self):
+        """Wait for the next free request slot"""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        delay = self.next_slot - now
+        self.next_slot = max(now, self.next_slot) + self.interval
+        
+        if delay > 0:
+            await asyncio.sleep(delay)
+
 class GoogleMapsService:
     """Service for calculating distances using Google Maps Distance Matrix API"""
     
-    def __init__(self):
+    # Number in distance text like "8.2 km" or "1.2 mi" (thousands separators removed first)
+    _DIST_RE = re.compile(r'(\d+\.?\d*)')
+    
+    def __init__(self, cache_path: Optional[str] = ".cache/gmaps_distances.sqlite"):
         self.api_key = os.getenv('GOOGLE_API_KEY')
         self.base_url = "https://maps.googleapis.com/maps/api/distancematrix/json"
         office_lat = os.getenv('OFFICE_LAT', '24.785698')
         office_lng = os.getenv('OFFICE_LNG', '46.613715')
         self.office_coords = f"{office_lat},{office_lng}"
+        self.office_location = (float(office_lat), float(office_lng))
         self.timeout = 30
-        self.delay = 2  # 2 second delay between API calls
+        self.max_retries = 5  # Retries when Google reports the quota is exceeded
+        self.max_backoff = 8  # Longest wait in seconds between those retries
+        self.max_concurrent_requests = 4
+        self.connection_pool_size = 8
+        self.requests_per_second = 10  # Stay within the Distance Matrix QPS quota
         
         print(f"🔑 API Key loaded: {'Yes' if self.api_key else 'No'}")
         
         if not self.api_key:
             raise ValueError("GOOGLE_API_KEY environment variable is required")
+        
+        # Cache results across runs; pass cache_path=None to always query the API
+        self.cache = DistanceCache(cache_path) if cache_path else None
     
     def calculate_distances(self, apartment_coords: List[Tuple[float, float]]) -> List[Dict]:
         """
@@ -44,31 +153,78 @@ class GoogleMapsService:
         if not apartment_coords:
             return []
         
+        # Listings in the same building share coordinates; only request each location once
+        coords_by_key = {}
+        for lat, lng in apartment_coords:
+            coords_by_key.setdefault(DistanceCache.make_key(self.office_location, lat, lng), (lat, lng))
+        
+        # Reuse results from earlier runs
+        results_by_key = self.cache.get_many(list(coords_by_key)) if self.cache else {}
+        missing_keys = [key for key in coords_by_key if key not in results_by_key]
+        
         # Google Maps API limit: 25 destinations per request
         batch_size = 25
-        all_results = []
         
-        print(f"🌍 Calculating distances for {len(apartment_coords)} apartments in batches of {batch_size}...")
+        print(f"🌍 Calculating distances for {len(apartment_coords)} apartments "
+              f"({len(coords_by_key)} unique locations, {len(results_by_key)} cached) in batches of {batch_size}...")
         
-        # Process in batches
-        for i in range(0, len(apartment_coords), batch_size):
-            batch_coords = apartment_coords[i:i + batch_size]
-            batch_results = self._calculate_batch_distances(batch_coords)
-            all_results.extend(batch_results)
+        # Request all uncached batches concurrently
+        batch_keys = [missing_keys[i:i + batch_size] for i in range(0, len(missing_keys), batch_size)]
+        if batch_keys:
+            batch_results = asyncio.run(self._calculate_batches_async(
+                [[coords_by_key[key] for key in keys] for keys in batch_keys]
+            ))
+            new_results = {
+                key: result
+                for keys, results in zip(batch_keys, batch_results)
+                for key, result in zip(keys, results)
+            }
+            results_by_key.update(new_results)
             
-            # Add delay between batches to respect rate limits
-            if i + batch_size < len(apartment_coords):
-                print(f"⏳ Waiting {self.delay} seconds before next batch...")
-                time.sleep(self.delay)
+            if self.cache:
+                self.cache.set_many(new_results)
+        
+        # Map results back to the requested coordinates
+        all_results = [
+            results_by_key.get(DistanceCache.make_key(self.office_location, lat, lng)) or self._create_error_result()
+            for lat, lng in apartment_coords
+        ]
         
         print(f"✅ Successfully calculated distances for {len(all_results)} apartments")
         return all_results
     
-    def _calculate_batch_distances(self, apartment_coords: List[Tuple[float, float]]) -> List[Dict]:
+    async def _calculate_batches_async(self, coord_batches: List[List[Tuple[float, float]]]) -> List[List[Dict]]:
+        """
+        Calculate distances for several batches over a shared HTTP session
+        
+        Args:
+            coord_batches: Batches of (lat, lng) tuples (max 25 per batch)
+            
+        Returns:
+            List of batch results, in the same order as coord_batches
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+        limiter = RateLimiter(self.requests_per_second)
+        
+        async def limited(session, coords):
+            async with semaphore:
+                await limiter.wait()
+                return await self._calculate_batch_async(session, coords)
+        
+        # One keep-alive connection pool for all batches, so TLS is only negotiated once per connection
+        connector = aiohttp.TCPConnector(limit=self.connection_pool_size, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        headers = {'Accept-Encoding': 'gzip'}
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers) as session:
+            return await asyncio.gather(*(limited(session, coords) for coords in coord_batches))
+    
+    async def _calculate_batch_async(self, session: aiohttp.ClientSession,
+                                     apartment_coords: List[Tuple[float, float]]) -> List[Dict]:
         """
         Calculate distances for a single batch of apartment coordinates
         
         Args:
+            session: Shared aiohttp session
             apartment_coords: List of (lat, lng) tuples for apartment locations (max 25)
             
         Returns:
@@ -88,19 +244,24 @@ class GoogleMapsService:
         }
         
         try:
-            # Make API request
-            response = requests.get(
-                self.base_url,
-                params=params,
-                timeout=self.timeout
-            )
+            # Make API request, backing off only when we are over the query quota
+            for attempt in range(self.max_retries):
+                async with session.get(self.base_url, params=params) as response:
+                    status_code = response.status
+                    data = await response.json() if status_code == 200 else None
+                
+                over_limit = status_code == 429 or (data is not None and data.get('status') == 'OVER_QUERY_LIMIT')
+                if not over_limit or attempt == self.max_retries - 1:
+                    break
+                
+                backoff = min(2 ** attempt * 0.5, self.max_backoff)
+                print(f"⏳ Over query limit, retrying batch in {backoff} seconds...")
+                await asyncio.sleep(backoff)
             
-            if response.status_code != 200:
-                print(f"❌ API request failed with status {response.status_code}")
+            if data is None:
+                print(f"❌ API request failed with status {status_code}")
                 return [self._create_error_result() for _ in apartment_coords]
             
-            data = response.json()
-            
             if data.get('status') != 'OK':
                 print(f"❌ API returned error: {data.get('status')}")
                 if 'error_message' in data:
@@ -134,9 +295,12 @@ class GoogleMapsService:
                 
                 results.append(result)
             
-            return results
+            # A short response must not shift or drop results; missing elements count as errors
+            results.extend(self._create_error_result() for _ in range(len(apartment_coords) - len(results)))
+            
+            return results[:len(apartment_coords)]
             
-        except requests.exceptions.RequestException as e:
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             print(f"❌ Network error: {e}")
             return [self._create_error_result() for _ in apartment_coords]
         except Exception as e:
@@ -168,8 +332,7 @@ class GoogleMapsService:
         
         try:
             # Extract number from text like "8.2 km" or "1.2 mi"
-            import re
-            match = re.search(r'([\d,]+\.?\d*)', distance_text.replace(',', ''))
+            match = self._DIST_RE.search(distance_text.replace(',', ''))
             if match:
                 distance_value = float(match.group(1))
                 
@@ -196,55 +359,28 @@ class GoogleMapsService:
         if not listings:
             return listings
         
-        # Extract coordinates from listings
-        coords = []
-        valid_indices = []
-        
-        for i, listing in enumerate(listings):
-            location = listing.get('location', {})
+        # Collect coordinates in one pass, marking listings that have none
+        located = []
+        for listing in listings:
+            location = listing['location']
             lat = location.get('lat')
             lng = location.get('lng')
             
             if lat and lng:
-                coords.append((lat, lng))
-                valid_indices.append(i)
-            else:
-                coords.append((None, None))
-                valid_indices.append(i)
-        
-        # Calculate distances
-        distances = self.calculate_distances([(lat, lng) for lat, lng in coords if lat and lng])
-        
-        # Add distance info to listings
-        distance_index = 0
-        for i, listing in enumerate(listings):
-            location = listing.get('location', {})
-            lat = location.get('lat')
-            lng = location.get('lng')
-            
-            if lat and lng and distance_index < len(distances):
-                distance_info = distances[distance_index]
-                
-                # Add distance information to location
-                listing['location']['distance_from_office'] = {
-                    'distance_km': distance_info['distance_km'],
-                    'distance_meters': distance_info['distance_meters'],
-                    'duration_text': distance_info['duration_text'],
-                    'duration_seconds': distance_info['duration_seconds'],
-                    'status': distance_info['status']
-                }
-                distance_index += 1
+                located.append((location, (lat, lng)))
             else:
-                # No coordinates or API error
-                listing['location']['distance_from_office'] = {
+                location['distance_from_office'] = {
                     'distance_km': 0,
                     'distance_meters': 0,
                     'duration_text': 'N/A',
                     'duration_seconds': 0,
-                    'status': 'NO_COORDINATES' if not (lat and lng) else 'API_ERROR'
+                    'status': 'NO_COORDINATES'
                 }
         
-        # Add delay between API calls
-        time.sleep(self.delay)
+        # Calculate distances and write them back to the located listings
+        distances = self.calculate_distances([coords for _, coords in located])
+        
+        for (location, _), distance_info in zip(located, distances):
+            location['distance_from_office'] = dict(distance_info)
         
         return listings
@@ -3,9 +3,50 @@
 Verify the results from the latest scraping
 """
 
-import json
+import ijson
+from collections import deque
 from pathlib import Path
 
+LISTING_PREFIX = 'data.Web.find.listings.item'
+
+def scan_results_file(f):
+    """
+    Read metadata, the listings count and the first/last listing in one streaming pass
+    
+    Only metadata and listing objects are built; everything else is skipped at the event level.
+    """
+    metadata = {}
+    actual_count = 0
+    first_listing = None
+    last_listing = deque(maxlen=1)
+    
+    builder = None
+    builder_prefix = None
+    
+    for prefix, event, value in ijson.parse(f, use_float=True):
+        if builder is None:
+            if event == 'start_map' and prefix in ('metadata', LISTING_PREFIX):
+                builder = ijson.ObjectBuilder()
+                builder_prefix = prefix
+                builder.event(event, value)
+            continue
+        
+        builder.event(event, value)
+        if event != 'end_map' or prefix != builder_prefix:
+            continue
+        
+        # A complete metadata or listing object has been built
+        if builder_prefix == 'metadata':
+            metadata = builder.value
+        else:
+            actual_count += 1
+            if first_listing is None:
+                first_listing = builder.value
+            last_listing.append(builder.value)
+        builder = None
+    
+    return metadata, actual_count, first_listing, (last_listing[0] if last_listing else None)
+
 def verify_latest_results():
     """Verify the latest scraping results"""
     
@@ -23,12 +64,11 @@ def verify_latest_results():
     print(f"📁 Latest file: {latest_file.name}")
     print(f"📊 File size: {latest_file.stat().st_size / 1024 / 1024:.1f} MB")
     
-    # Read the file
-    with open(latest_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    # Stream the file once: only metadata and the first/last listings are kept in memory
+    with open(latest_file, 'rb') as f:
+        metadata, actual_count, first_listing, last_listing = scan_results_file(f)
     
     # Extract metadata
-    metadata = data.get('metadata', {})
     district_id = metadata.get('district_id')
     district_name = metadata.get('district_name')
     total_listings = metadata.get('total_listings')
@@ -44,18 +84,13 @@ def verify_latest_results():
     print(f"  Page size: {pagination.get('page_size')}")
     print(f"  Total pages: {pagination.get('total_pages')}")
     
-    # Extract actual listings
-    listings = data.get('data', {}).get('data', {}).get('Web', {}).get('find', {}).get('listings', [])
-    actual_count = len(listings)
-    
     print(f"\n✅ VERIFICATION:")
     print(f"  Actual listings in file: {actual_count}")
     print(f"  Metadata says: {total_listings}")
     print(f"  Match: {'✅' if actual_count == total_listings else '❌'}")
     
     # Show first listing sample
-    if listings:
-        first_listing = listings[0]
+    if first_listing is not None:
         print(f"\n📄 FIRST LISTING SAMPLE:")
         print(f"  ID: {first_listing.get('id')}")
         print(f"  Title: {first_listing.get('title', 'N/A')}")
@@ -65,8 +100,7 @@ def verify_latest_results():
         print(f"  Address: {first_listing.get('address', 'N/A')}")
     
     # Show last listing sample
-    if listings:
-        last_listing = listings[-1]
+    if last_listing is not None:
         print(f"\n📄 LAST LISTING SAMPLE:")
         print(f"  ID: {last_listing.get('id')}")
         print(f"  Title: {last_listing.get('title', 'N/A')}")